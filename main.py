@@ -1,10 +1,16 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from truedata_ws.websocket.TD import TD
-import requests
+from cachetools import TTLCache
+import httpx
+import orjson
+import numpy as np
+import asyncio
 import os
+import functools
+import hashlib
 import time
 import random
-from datetime import datetime, timedelta
+from datetime import date, timedelta
 from dotenv import load_dotenv
 
 # 1. Load Environment Variables
@@ -24,6 +30,109 @@ TD_FUNDAMENTAL_URL = "https://api.truedata.in/fundamental" # ✅ Corrected API U
 # Global TrueData Connection Object
 td_app = None
 
+# --- UPSTREAM RESPONSE CACHE ---
+# EOD candles & fundamentals change at most daily, intraday bars every minute
+EOD_CACHE = TTLCache(maxsize=1024, ttl=3600)
+INTRADAY_CACHE = TTLCache(maxsize=1024, ttl=60)
+FUNDAMENTAL_CACHE = TTLCache(maxsize=1024, ttl=3600)
+
+# Browser/CDN cache lifetimes (seconds) for the REST endpoints
+EOD_MAX_AGE = 3600
+INTRADAY_MAX_AGE = 60
+NEWS_MAX_AGE = 300
+
+# In-flight upstream fetches (key -> Task) so concurrent misses share one request
+_inflight_fetches = {}
+
+# Bound concurrent calls per upstream so a slow TrueData can't pile up requests
+HISTORY_SEM = asyncio.Semaphore(8)
+FUNDAMENTAL_SEM = asyncio.Semaphore(4)
+UPSTREAM_RETRIES = 1
+# Failures before any request bytes were sent: quick and safe to retry
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+# --- LIVE SUBSCRIPTIONS ---
+# Symbols already subscribed on the TrueData socket (clean_sym -> req_id)
+_subscribed = {}
+# Serializes subscribe/unsubscribe so no symbol is ever subscribed twice
+_subscribe_lock = asyncio.Lock()
+# The TrueData SDK is blocking; bound how many worker threads it may tie up
+SDK_SEM = asyncio.Semaphore(16)
+# Symbols still waiting on their first tick (clean_sym -> Event)
+_pending = {}
+# Fields the SDK only fills in once real data (touchline, trade or bar) arrives
+READY_TICK_FIELDS = ("timestamp", "tick_type", "ltp", "close")
+# Wakes tick_watcher when _pending goes from empty to non-empty
+_pending_added = asyncio.Event()
+# Last time a client asked for a symbol (clean_sym -> monotonic seconds)
+_last_access = {}
+TICK_WAIT_TIMEOUT = 0.5
+TICK_POLL_INTERVAL = 0.02
+SUBSCRIPTION_IDLE_TTL = 300  # Unsubscribe symbols nobody asked for in 5 min
+SUBSCRIPTION_PRUNE_INTERVAL = 60
+WS_PUSH_INTERVAL = 0.05  # How often /ws/quotes checks for fresh ticks
+
+# Random source for mock (US) data
+_rng = np.random.default_rng()
+
+# --- MARKET DEPTH FIELDS (5 levels of bid/ask on TrueData ticks) ---
+BID_FIELDS = tuple((f"bid{i}_rate", f"bid{i}_qty") for i in range(1, 6))
+ASK_FIELDS = tuple((f"ask{i}_rate", f"ask{i}_qty") for i in range(1, 6))
+
+# Every tick field a quote needs, in read order:
+# ltp, change, change_perc, volume, day_high, day_low, then bid1..5, ask1..5 (rate, qty)
+TICK_FIELDS = (
+    ("ltp", "change", "change_perc", "volume", "day_high", "day_low")
+    + tuple(field for pair in BID_FIELDS + ASK_FIELDS for field in pair)
+)
+
+# --- HISTORY CANDLE FIELDS (in TrueData record order) ---
+HISTORY_COLUMNS = ("date", "open", "high", "low", "close", "volume")
+
+# --- STATIC PAYLOADS ---
+# Default "Empty" fundamentals, shared read-only and copied per response
+_EMPTY_FUNDAMENTALS = {
+    "market_cap": 0,
+    "pe_ratio": 0,
+    "peg_ratio": 0,
+    "book_value": 0,
+    "dividend_yield": 0,
+    "eps": 0,
+    "profit_margin": 0,
+    "roe": 0,
+    "debt_to_equity": 0,
+    "shareholding": {"promoters": 0, "institutions": 0, "public": 0},
+    "forecast": {
+        "recommendation": "WAITING",
+        "targetMean": 0,
+        "targetLow": 0,
+        "targetHigh": 0
+    }
+}
+EMPTY_FUNDAMENTALS_INR = {**_EMPTY_FUNDAMENTALS, "currency": "INR"}
+EMPTY_FUNDAMENTALS_USD = {**_EMPTY_FUNDAMENTALS, "currency": "USD"}
+
+# Corporate news: only the titles depend on the symbol
+NEWS_Q3_META = {
+    "date": "2024-10-15", 
+    "sentiment": "Positive",
+    "link": "https://www.moneycontrol.com", 
+    "publisher": "TrueData News"
+}
+NEWS_ANALYST_CALL = {
+    "title": "Analyst Call scheduled for next Tuesday", 
+    "date": "2024-10-10", 
+    "sentiment": "Neutral",
+    "link": "https://www.bloomberg.com", 
+    "publisher": "Bloomberg"
+}
+NEWS_PRODUCT_META = {
+    "date": "2024-10-05", 
+    "sentiment": "Positive",
+    "link": "https://economictimes.indiatimes.com", 
+    "publisher": "Economic Times"
+}
+
 # --- SYMBOL MAPPING ---
 INDEX_MAP = {
     "^NSEI": "NIFTY 50",
@@ -36,6 +145,17 @@ INDEX_MAP = {
 @app.on_event("startup")
 async def startup_event():
     global td_app
+    # Shared HTTP client so TrueData REST calls reuse pooled connections
+    # (HTTP/2 multiplexing when the server negotiates it, keep-alive HTTP/1.1 otherwise)
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(5.0, connect=1.0),
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=32, keepalive_expiry=300)
+    )
+    app.state.background_tasks = [
+        asyncio.create_task(tick_watcher()),
+        asyncio.create_task(subscription_pruner())
+    ]
     if TD_USER:
         try:
             print(f"🔌 Connecting to TrueData ({TD_USER}) on Port {TD_PORT}...")
@@ -48,46 +168,316 @@ async def startup_event():
 
 # --- SHUTDOWN EVENT (Crucial for TrueData) ---
 @app.on_event("shutdown")
-def shutdown_event():
+async def shutdown_event():
     global td_app
+    for task in app.state.background_tasks:
+        task.cancel()
+    await app.state.http.aclose()
     if td_app:
         print("🔌 Disconnecting TrueData to release session...")
         try:
-            td_app.disconnect()
+            await run_sdk(td_app.disconnect)
             print("✅ TrueData Disconnected.")
         except Exception as e:
             print(f"⚠️ Disconnect error: {e}")
 
 # --- HELPERS ---
+@functools.lru_cache(maxsize=4096)
 def get_clean_symbol(symbol: str):
     """Removes .NS/.BO suffix for TrueData"""
     return INDEX_MAP.get(symbol, symbol.replace(".NS", "").replace(".BO", ""))
 
 def is_indian_stock(symbol: str) -> bool:
     """Checks if symbol should be routed to TrueData"""
-    return symbol.endswith(".NS") or symbol.endswith(".BO") or symbol in INDEX_MAP
+    return symbol in INDEX_MAP or symbol.endswith((".NS", ".BO"))
+
+async def upstream_get(url, params, **kwargs):
+    """
+    GET via the shared client, retrying once if the connection couldn't be made.
+    Read timeouts aren't retried: that would hold the upstream semaphore for two
+    full timeouts while TrueData is degraded.
+    """
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        try:
+            return await app.state.http.get(url, params=params, **kwargs)
+        except RETRYABLE_ERRORS as e:
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            print(f"⚠️ Upstream retry after {type(e).__name__}: {url}")
+
+def is_history_payload(data) -> bool:
+    """TrueData history JSON carries its candles under "Records"; error bodies don't"""
+    return isinstance(data, dict) and isinstance(data.get("Records"), list)
+
+def is_fundamental_payload(data) -> bool:
+    """company_info answers with a JSON object; anything else is an error body"""
+    return isinstance(data, dict)
+
+async def cached_fetch(cache, key, semaphore, url, params, is_valid, **kwargs):
+    """
+    Returns (status_code, json) for an upstream GET, served from cache when possible.
+    json is None unless the response was a 200 whose body passes is_valid(); only
+    those are cached, so errors and error-shaped 200s are retried on the next call.
+    Concurrent misses on the same key await one shared fetch, success or failure;
+    misses are bounded by the given per-upstream semaphore.
+    """
+    if key in cache:
+        return 200, cache[key]
+
+    task = _inflight_fetches.get(key)
+    if task is None:
+        task = asyncio.create_task(_fetch_into_cache(cache, key, semaphore, url, params, is_valid, **kwargs))
+        _inflight_fetches[key] = task
+        task.add_done_callback(lambda _: _inflight_fetches.pop(key, None))
+    # Shielded so one caller disconnecting doesn't cancel the fetch for the others
+    return await asyncio.shield(task)
+
+async def _fetch_into_cache(cache, key, semaphore, url, params, is_valid, **kwargs):
+    """The single upstream call behind cached_fetch; caches valid 200 responses only"""
+    async with semaphore:
+        response = await upstream_get(url, params, **kwargs)
+    if response.status_code != 200:
+        return response.status_code, None
+
+    data = orjson.loads(response.content)
+    if not is_valid(data):
+        print(f"⚠️ Unexpected 200 payload from {url}: not caching")
+        return 200, None
+    cache[key] = data
+    return 200, data
+
+def json_response(payload):
+    """Serializes payload with orjson (FastAPI's ORJSONResponse is deprecated)"""
+    return Response(content=orjson.dumps(payload), media_type="application/json")
+
+def no_store_response(payload):
+    """For mock/fallback payloads that browsers and CDNs must not keep"""
+    response = json_response(payload)
+    response.headers["Cache-Control"] = "no-store"
+    return response
+
+def cacheable_response(request: Request, payload, max_age: int):
+    """
+    Serializes payload with an ETag + Cache-Control header.
+    Returns an empty 304 when the client's If-None-Match already matches.
+    """
+    body = orjson.dumps(payload)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+
+    # Weak comparison (RFC 9110): W/"x" matches "x", and * matches any representation
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if etag in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def has_tick(req_id) -> bool:
+    """
+    True once TrueData has pushed real data for req_id.
+    start_live_data creates an empty placeholder in live_data straight away,
+    so presence alone doesn't count. The touchline snapshot sent on subscribe
+    fills ltp/tick_type (close on bar data) without a timestamp, which only
+    trade ticks set, so any of these marks the tick as ready.
+    """
+    tick = td_app.live_data.get(req_id)
+    return tick is not None and any(getattr(tick, field, None) is not None for field in READY_TICK_FIELDS)
+
+async def tick_watcher():
+    """Background task: wakes up quote requests once their first tick lands"""
+    while True:
+        if not (td_app and _pending):
+            # Sleep until someone starts waiting instead of polling an empty registry
+            _pending_added.clear()
+            await _pending_added.wait()
+            continue
+        for sym, event in list(_pending.items()):
+            if has_tick(_subscribed.get(sym)):
+                event.set()
+                del _pending[sym]
+        await asyncio.sleep(TICK_POLL_INTERVAL)
+
+async def run_sdk(func, *args):
+    """Runs a blocking TrueData SDK call in a worker thread, bounded by SDK_SEM"""
+    async with SDK_SEM:
+        return await asyncio.to_thread(func, *args)
+
+async def subscription_pruner():
+    """Background task: drops TrueData subscriptions that have gone idle"""
+    while True:
+        await asyncio.sleep(SUBSCRIPTION_PRUNE_INTERVAL)
+        if td_app:
+            await prune_idle_subscriptions()
+
+async def prune_idle_subscriptions():
+    """Unsubscribes every symbol nobody has asked for in SUBSCRIPTION_IDLE_TTL"""
+    async with _subscribe_lock:
+        cutoff = time.monotonic() - SUBSCRIPTION_IDLE_TTL
+        idle = [sym for sym, ts in _last_access.items() if ts < cutoff]
+        if not idle:
+            return
+
+        # Forget them before the (slow) SDK call: a request arriving meanwhile sees
+        # the symbol as unsubscribed and resubscribes once we release the lock,
+        # instead of being handed the stale live_data entry the SDK leaves behind
+        for sym in idle:
+            _subscribed.pop(sym, None)
+            _last_access.pop(sym, None)
+            event = _pending.pop(sym, None)
+            if event:
+                event.set()
+
+        try:
+            # The SDK keys its subscriptions by uppercased contract
+            await run_sdk(td_app.stop_live_data, [sym.upper() for sym in idle])
+            print(f"🧹 Unsubscribed idle symbols: {', '.join(idle)}")
+        except Exception as e:
+            print(f"⚠️ Unsubscribe error: {e}")
+
+async def wait_for_ticks(clean_syms):
+    """
+    Subscribes symbols once (new ones in a single batched call) and waits briefly
+    for their first ticks. Concurrent callers share the same subscription and Event;
+    symbols that already have a tick return immediately.
+    Returns {clean_sym: req_id} for every symbol TrueData accepted.
+    """
+    clean_syms = list(dict.fromkeys(clean_syms))
+    new_syms = [sym for sym in clean_syms if sym not in _subscribed]
+    if new_syms:
+        async with _subscribe_lock:
+            # Re-check: another request may have subscribed these while we waited
+            new_syms = [sym for sym in new_syms if sym not in _subscribed]
+            if new_syms:
+                req_ids = await run_sdk(td_app.start_live_data, new_syms)
+                # start_live_data dedupes through a set, so ids come back in arbitrary
+                # order; map them via the (uppercased) contract stored on each tick
+                by_contract = {
+                    td_app.live_data[rid].symbol: rid for rid in req_ids or [] if rid in td_app.live_data
+                }
+                for sym in new_syms:
+                    if sym.upper() in by_contract:
+                        _subscribed[sym] = by_contract[sym.upper()]
+
+    now = time.monotonic()
+    req_ids = {}
+    waits = []
+    for sym in clean_syms:
+        req_id = _subscribed.get(sym)
+        if req_id is None:
+            continue
+        req_ids[sym] = req_id
+        _last_access[sym] = now
+        if not has_tick(req_id):
+            waits.append(_pending.setdefault(sym, asyncio.Event()).wait())
+        elif sym in _pending:
+            # Ready before tick_watcher noticed; release anyone still waiting
+            _pending.pop(sym).set()
+
+    if waits:
+        _pending_added.set()
+        try:
+            await asyncio.wait_for(asyncio.gather(*waits), timeout=TICK_WAIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+    return req_ids
+
+async def wait_for_tick(clean_sym: str):
+    """Single-symbol wait_for_ticks. Returns req_id or None."""
+    req_ids = await wait_for_ticks([clean_sym])
+    return req_ids.get(clean_sym)
+
+def read_tick(tick):
+    """
+    Returns TICK_FIELDS values of a tick, defaulting missing ones to 0.
+    The SDK's TickLiveData/MinLiveData don't carry every field (no bidN/askN depth),
+    so a per-field getattr with a default is the only safe read.
+    """
+    return tuple(getattr(tick, field, 0) for field in TICK_FIELDS)
+
+def tick_to_quote(symbol: str, req_id):
+    """Builds the quote payload from the cached TrueData tick for req_id"""
+    if not has_tick(req_id):
+        return {"symbol": symbol, "price": 0, "status": "Waiting for tick..."}
+    tick = td_app.live_data[req_id]
+
+    ltp, change, change_perc, volume, day_high, day_low, *depth = read_tick(tick)
+
+    # 🔥 Extract Market Depth (Order Book)
+    orderbook = {
+        "bids": [{"price": depth[i], "qty": depth[i + 1]} for i in range(0, 10, 2)],
+        "asks": [{"price": depth[i], "qty": depth[i + 1]} for i in range(10, 20, 2)]
+    }
+
+    return {
+        "symbol": symbol,
+        "price": ltp,
+        "change": change,
+        "change_percent": change_perc,
+        "volume": volume,
+        "high": day_high,
+        "low": day_low,
+        "orderbook": orderbook,
+        "currency": "INR",
+        "source": "TrueData"
+    }
 
-def generate_mock_history(base_price=150):
+def generate_mock_quote(symbol: str):
+    """Fallback quote for US stocks"""
+    return {
+        "symbol": symbol, 
+        "price": random.uniform(100, 3000), 
+        "change": random.uniform(-5, 5),
+        "change_percent": random.uniform(-1, 1),
+        "currency": "USD", 
+        "source": "Mock (US)"
+    }
+
+def to_columnar(candles):
+    """Converts a list of candle dicts into one list per HISTORY_COLUMNS field"""
+    return {col: [candle[col] for candle in candles] for col in HISTORY_COLUMNS}
+
+@functools.lru_cache(maxsize=32)
+def history_window(period: str, today: date):
+    """Returns (resolution, from, to) TrueData params; formatted once per day"""
+    if period == "1d":
+        start_date = today - timedelta(days=5)
+        resolution = "15min"
+    elif period == "1y":
+        start_date = today - timedelta(days=365)
+        resolution = "EOD"
+    else:
+        start_date = today - timedelta(days=30)
+        resolution = "EOD"
+    return resolution, start_date.strftime("%y%m%d"), today.strftime("%y%m%d")
+
+@functools.lru_cache(maxsize=8)
+def mock_dates(today: date, days: int):
+    """ISO date labels for the mock series, built once per day"""
+    return [(today - timedelta(days=days-i)).isoformat() for i in range(days)]
+
+def generate_mock_history(base_price=150, days=30):
     """Fallback for US stocks so charts don't crash"""
-    data = []
-    now = datetime.now()
-    price = base_price
-    for i in range(30):
-        dt = now - timedelta(days=30-i)
-        price = price * (1 + (random.random() - 0.5) * 0.03)
-        data.append({
-            "date": dt.strftime("%Y-%m-%d"),
-            "open": round(price * 0.99, 2),
-            "high": round(price * 1.01, 2),
-            "low": round(price * 0.98, 2),
-            "close": round(price, 2),
-            "volume": int(random.uniform(1000, 10000))
-        })
-    return data
+    dates = mock_dates(date.today(), days)
+
+    # Random walk of ±1.5% daily moves, computed in one vectorized pass
+    prices = base_price * np.cumprod(1 + (_rng.random(days) - 0.5) * 0.03)
+    opens = np.round(prices * 0.99, 2).tolist()
+    highs = np.round(prices * 1.01, 2).tolist()
+    lows = np.round(prices * 0.98, 2).tolist()
+    closes = np.round(prices, 2).tolist()
+    volumes = _rng.integers(1000, 10000, days).tolist()
+
+    return [
+        {"date": d, "open": o, "high": h, "low": l, "close": c, "volume": v}
+        for d, o, h, l, c, v in zip(dates, opens, highs, lows, closes, volumes)
+    ]
 
 # --- FEATURE 1: LIVE QUOTE + ORDER BOOK (Level 2) ---
 @app.get("/quote")
-def get_quote(symbol: str):
+async def get_quote(symbol: str):
+    return json_response(await fetch_quote(symbol))
+
+async def fetch_quote(symbol: str):
     global td_app
     
     # A. INDIAN STOCKS (TrueData WebSocket)
@@ -97,52 +487,14 @@ def get_quote(symbol: str):
             
         try:
             clean_sym = get_clean_symbol(symbol)
-            req_ids = td_app.start_live_data([clean_sym])
+            # Subscribe once & wait briefly for tick if not in cache
+            req_id = await wait_for_tick(clean_sym)
             
             # Request ID handling
-            if not req_ids:
+            if req_id is None:
                  return {"symbol": symbol, "price": 0, "status": "Invalid Symbol"}
-            req_id = req_ids[0]
-            
-            # Wait briefly for tick if not in cache
-            if req_id not in td_app.live_data:
-                time.sleep(0.2) 
-                
-            if req_id in td_app.live_data:
-                tick = td_app.live_data[req_id]
                 
-                # 🔥 Extract Market Depth (Order Book)
-                orderbook = {
-                    "bids": [
-                        {"price": getattr(tick, 'bid1_rate', 0), "qty": getattr(tick, 'bid1_qty', 0)},
-                        {"price": getattr(tick, 'bid2_rate', 0), "qty": getattr(tick, 'bid2_qty', 0)},
-                        {"price": getattr(tick, 'bid3_rate', 0), "qty": getattr(tick, 'bid3_qty', 0)},
-                        {"price": getattr(tick, 'bid4_rate', 0), "qty": getattr(tick, 'bid4_qty', 0)},
-                        {"price": getattr(tick, 'bid5_rate', 0), "qty": getattr(tick, 'bid5_qty', 0)}
-                    ],
-                    "asks": [
-                        {"price": getattr(tick, 'ask1_rate', 0), "qty": getattr(tick, 'ask1_qty', 0)},
-                        {"price": getattr(tick, 'ask2_rate', 0), "qty": getattr(tick, 'ask2_qty', 0)},
-                        {"price": getattr(tick, 'ask3_rate', 0), "qty": getattr(tick, 'ask3_qty', 0)},
-                        {"price": getattr(tick, 'ask4_rate', 0), "qty": getattr(tick, 'ask4_qty', 0)},
-                        {"price": getattr(tick, 'ask5_rate', 0), "qty": getattr(tick, 'ask5_qty', 0)}
-                    ]
-                }
-
-                return {
-                    "symbol": symbol,
-                    "price": getattr(tick, 'ltp', 0),
-                    "change": getattr(tick, 'change', 0),
-                    "change_percent": getattr(tick, 'change_perc', 0),
-                    "volume": getattr(tick, 'volume', 0),
-                    "high": getattr(tick, 'day_high', 0),
-                    "low": getattr(tick, 'day_low', 0),
-                    "orderbook": orderbook,
-                    "currency": "INR",
-                    "source": "TrueData"
-                }
-            else:
-                return {"symbol": symbol, "price": 0, "status": "Waiting for tick..."}
+            return tick_to_quote(symbol, req_id)
                 
         except Exception as e:
             print(f"Quote Error: {e}")
@@ -150,114 +502,203 @@ def get_quote(symbol: str):
 
     # B. US STOCKS (Mock/Simulation)
     else:
-        return {
-            "symbol": symbol, 
-            "price": random.uniform(100, 3000), 
-            "change": random.uniform(-5, 5),
-            "change_percent": random.uniform(-1, 1),
-            "currency": "USD", 
-            "source": "Mock (US)"
-        }
+        return generate_mock_quote(symbol)
+
+# --- FEATURE 1b: BATCH QUOTES (Watchlists) ---
+@app.get("/quotes")
+async def get_quotes(symbols: str):
+    """
+    Resolves a comma-separated list of symbols in one round-trip.
+    All Indian symbols share one batched subscribe and a single tick wait.
+    """
+    symbol_list = [sym.strip() for sym in symbols.split(",") if sym.strip()]
+    indian = {sym: get_clean_symbol(sym) for sym in symbol_list if is_indian_stock(sym)}
+
+    quotes = {}
+    if indian and not td_app:
+        quotes.update({sym: {"symbol": sym, "price": 0, "status": "Disconnected"} for sym in indian})
+    elif indian:
+        try:
+            req_ids = await wait_for_ticks(list(indian.values()))
+            for sym, clean_sym in indian.items():
+                req_id = req_ids.get(clean_sym)
+                if req_id is None:
+                    quotes[sym] = {"symbol": sym, "price": 0, "status": "Invalid Symbol"}
+                else:
+                    quotes[sym] = tick_to_quote(sym, req_id)
+        except Exception as e:
+            print(f"Quotes Error: {e}")
+            quotes.update({sym: {"symbol": sym, "price": 0, "error": str(e)} for sym in indian})
+
+    # Keep the caller's ordering; US symbols are served from the mock generator
+    return json_response(
+        {sym: quotes[sym] if sym in indian else generate_mock_quote(sym) for sym in symbol_list}
+    )
+
+# --- FEATURE 1c: STREAMING QUOTES (WebSocket) ---
+def parse_watchlist(message: str):
+    """Returns the symbol list from a {"symbols": [...]} message, or None if malformed"""
+    try:
+        symbols = orjson.loads(message).get("symbols")
+    except (orjson.JSONDecodeError, AttributeError):
+        return None
+    if not isinstance(symbols, list) or not all(isinstance(sym, str) for sym in symbols):
+        return None
+    return symbols
+
+@app.websocket("/ws/quotes")
+async def ws_quotes(ws: WebSocket):
+    """
+    Pushes a quote message whenever a watched symbol's tick changes.
+    Client sends {"symbols": ["TCS.NS", ...]} at any time to replace its watchlist.
+    """
+    await ws.accept()
+    if not td_app:
+        await ws.send_text(orjson.dumps({"status": "Disconnected"}).decode())
+        await ws.close()
+        return
+
+    watchlist = {}  # symbol -> (clean_sym, req_id)
+    last_sent = {}
+
+    async def read_watchlist():
+        while True:
+            symbols = parse_watchlist(await ws.receive_text())
+            if symbols is None:
+                await ws.send_text(orjson.dumps({"error": "Expected {\"symbols\": [\"TCS.NS\", ...]}"}).decode())
+                continue
+
+            indian = {sym: get_clean_symbol(sym) for sym in symbols if is_indian_stock(sym)}
+            req_ids = await wait_for_ticks(list(indian.values()))
+
+            watchlist.clear()
+            last_sent.clear()
+            for sym in symbols:
+                if sym not in indian:
+                    status = "Unsupported"
+                elif indian[sym] not in req_ids:
+                    status = "Invalid Symbol"
+                else:
+                    watchlist[sym] = (indian[sym], req_ids[indian[sym]])
+                    continue
+                await ws.send_text(orjson.dumps({"symbol": sym, "price": 0, "status": status}).decode())
+
+    reader = asyncio.create_task(read_watchlist())
+    try:
+        while not reader.done():
+            now = time.monotonic()
+            for sym, (clean_sym, req_id) in list(watchlist.items()):
+                # Keep streamed symbols alive for subscription_pruner
+                _last_access[clean_sym] = now
+                quote = tick_to_quote(sym, req_id)
+                if quote != last_sent.get(sym):
+                    last_sent[sym] = quote
+                    await ws.send_text(orjson.dumps(quote).decode())
+            await asyncio.sleep(WS_PUSH_INTERVAL)
+        reader.result()
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        print(f"WebSocket Quote Error: {e}")
+        try:
+            await ws.close(code=1011)
+        except RuntimeError:
+            pass  # Socket already closed
+    finally:
+        reader.cancel()
 
 # --- FEATURE 2: HISTORICAL CHARTS (Real Data) ---
 @app.get("/history")
-def get_history(symbol: str, period: str = "1mo"):
+async def get_history(request: Request, symbol: str, period: str = "1mo", fmt: str = Query("rows", alias="format")):
     """
     Fetches real historical candles from TrueData REST API.
+    ?format=columnar returns {"date": [...], "open": [...], ...} instead of one dict per candle.
     """
+    chart_data, is_live = await fetch_history(symbol, period)
+    if fmt == "columnar":
+        chart_data = to_columnar(chart_data)
+    if not is_live:
+        return no_store_response(chart_data)
+    max_age = INTRADAY_MAX_AGE if period == "1d" else EOD_MAX_AGE
+    return cacheable_response(request, chart_data, max_age)
+
+async def fetch_history(symbol: str, period: str = "1mo"):
+    """Returns (candles, is_live); is_live is False for mock/fallback data"""
     if not is_indian_stock(symbol):
-        return generate_mock_history()
+        return generate_mock_history(), False
 
     clean_sym = get_clean_symbol(symbol)
-    end_date = datetime.now()
-    
-    # Determine resolution
-    if period == "1d":
-        start_date = end_date - timedelta(days=5) 
-        resolution = "15min"
-    elif period == "1y":
-        start_date = end_date - timedelta(days=365)
-        resolution = "EOD"
-    else:
-        start_date = end_date - timedelta(days=30)
-        resolution = "EOD" 
+    resolution, from_date, to_date = history_window(period, date.today())
 
     try:
         # Call TrueData History REST API
         params = {
             "symbol": clean_sym,
             "resolution": resolution,
-            "from": start_date.strftime("%y%m%d"),
-            "to": end_date.strftime("%y%m%d"),
+            "from": from_date,
+            "to": to_date,
             "response": "json",
             "user": TD_USER,
             "pass": TD_PASS
         }
         
-        response = requests.get(TD_HISTORY_URL, params=params, timeout=5)
+        cache = INTRADAY_CACHE if resolution != "EOD" else EOD_CACHE
+        cache_key = (clean_sym, resolution, params["from"])
+        status_code, data = await cached_fetch(
+            cache, cache_key, HISTORY_SEM, TD_HISTORY_URL, params, is_history_payload
+        )
         
-        if response.status_code == 200:
-            data = response.json()
-            records = data.get("Records", [])
+        if data is not None:
+            records = data["Records"]
             
-            chart_data = []
-            for row in records:
-                if len(row) >= 5:
-                    chart_data.append({
-                        "date": row[0],
-                        "open": row[1],
-                        "high": row[2],
-                        "low": row[3],
-                        "close": row[4],
-                        "volume": row[5] if len(row) > 5 else 0
-                    })
-            return chart_data
+            return [
+                {
+                    "date": row[0],
+                    "open": row[1],
+                    "high": row[2],
+                    "low": row[3],
+                    "close": row[4],
+                    "volume": row[5] if len(row) > 5 else 0
+                }
+                for row in records if len(row) >= 5
+            ], True
         else:
-            print(f"History API Error: {response.status_code}")
-            return generate_mock_history() 
+            print(f"History API Error: {status_code}")
+            return generate_mock_history(), False
             
     except Exception as e:
         print(f"History Exception: {e}")
-        return generate_mock_history()
+        return generate_mock_history(), False
 
 
 # --- FEATURE 3: FUNDAMENTALS (Research Data) ---
 @app.get("/fundamentals")
-def get_fundamentals(symbol: str):
+async def get_fundamentals(request: Request, symbol: str):
+    fundamentals, is_live = await fetch_fundamentals(symbol)
+    if not is_live:
+        return no_store_response(fundamentals)
+    return cacheable_response(request, fundamentals, EOD_MAX_AGE)
+
+async def fetch_fundamentals(symbol: str):
+    """Returns (fundamentals, is_live); is_live is False for the empty placeholder"""
     clean_sym = get_clean_symbol(symbol)
+    is_indian = is_indian_stock(symbol)
 
     # Default "Empty" State (Honest Data)
-    empty_data = {
-        "market_cap": 0,
-        "pe_ratio": 0,
-        "peg_ratio": 0,
-        "book_value": 0,
-        "dividend_yield": 0,
-        "eps": 0,
-        "profit_margin": 0,
-        "roe": 0,
-        "debt_to_equity": 0,
-        "shareholding": {"promoters": 0, "institutions": 0, "public": 0},
-        "forecast": {
-            "recommendation": "WAITING",
-            "targetMean": 0,
-            "targetLow": 0,
-            "targetHigh": 0
-        },
-        "currency": "INR" if is_indian_stock(symbol) else "USD"
-    }
+    empty_data = (EMPTY_FUNDAMENTALS_INR if is_indian else EMPTY_FUNDAMENTALS_USD).copy()
 
     # 1. Try Real API
-    if is_indian_stock(symbol):
+    if is_indian:
         try:
             # 🔥 Real API Call
             url = f"{TD_FUNDAMENTAL_URL}/company_info"
             params = {"symbol": clean_sym, "user": TD_USER, "pass": TD_PASS}
 
-            response = requests.get(url, params=params, timeout=3)
+            status_code, real_data = await cached_fetch(
+                FUNDAMENTAL_CACHE, clean_sym, FUNDAMENTAL_SEM, url, params, is_fundamental_payload, timeout=3
+            )
 
-            if response.status_code == 200:
-                real_data = response.json()
+            if real_data is not None:
                 return {
                     "market_cap": real_data.get("market_cap", 0),
                     "pe_ratio": real_data.get("pe", 0),
@@ -276,43 +717,52 @@ def get_fundamentals(symbol: str):
                         "targetHigh": real_data.get("target_high", 0)
                     },
                     "currency": "INR"
-                }
+                }, True
             else:
-                print(f"❌ API Failed {response.status_code}: Returning Empty Data")
-                return empty_data
+                print(f"❌ API Failed {status_code}: Returning Empty Data")
+                return empty_data, False
 
         except Exception as e:
             print(f"❌ Connection Error: {e}")
-            return empty_data
+            return empty_data, False
 
     # If not Indian stock or API failed completely
-    return empty_data
+    return empty_data, False
 
 # --- FEATURE 4: CORPORATE NEWS ---
 @app.get("/news")
-def get_news(symbol: str):
+def get_news(request: Request, symbol: str):
     clean_sym = get_clean_symbol(symbol)
     # ✅ FIX: Added links to prevent Frontend Crash
-    return [
-        {
-            "title": f"Strong Q3 Performance reported by {clean_sym}", 
-            "date": "2024-10-15", 
-            "sentiment": "Positive",
-            "link": "https://www.moneycontrol.com", 
-            "publisher": "TrueData News"
-        },
-        {
-            "title": "Analyst Call scheduled for next Tuesday", 
-            "date": "2024-10-10", 
-            "sentiment": "Neutral",
-            "link": "https://www.bloomberg.com", 
-            "publisher": "Bloomberg"
-        },
-        {
-            "title": f"New product line launch expected for {clean_sym}", 
-            "date": "2024-10-05", 
-            "sentiment": "Positive",
-            "link": "https://economictimes.indiatimes.com", 
-            "publisher": "Economic Times"
-        }
+    news = [
+        {"title": f"Strong Q3 Performance reported by {clean_sym}", **NEWS_Q3_META},
+        NEWS_ANALYST_CALL,
+        {"title": f"New product line launch expected for {clean_sym}", **NEWS_PRODUCT_META}
+    ]
+    return cacheable_response(request, news, NEWS_MAX_AGE)
+
+# --- FEATURE 5: STOCK DASHBOARD (Quote + Chart + Fundamentals) ---
+@app.get("/dashboard")
+async def get_dashboard(symbol: str, period: str = "1mo"):
+    """
+    Everything a stock detail page needs in one call.
+    Upstream lookups run concurrently, so latency is the slowest one, not the sum.
+    """
+    async def payload_only(fetch):
+        # fetch_history/fetch_fundamentals return (payload, is_live)
+        payload, _ = await fetch
+        return payload
+
+    results = await asyncio.gather(
+        fetch_quote(symbol),
+        payload_only(fetch_history(symbol, period)),
+        payload_only(fetch_fundamentals(symbol)),
+        return_exceptions=True
+    )
+    quote, history, fundamentals = [
+        {"error": str(result)} if isinstance(result, Exception) else result
+        for result in results
     ]
+    return json_response(
+        {"symbol": symbol, "quote": quote, "history": history, "fundamentals": fundamentals}
+    )
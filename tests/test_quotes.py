@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+import orjson
+import pytest
+from truedata_ws.websocket.TD import TD
+from truedata_ws.websocket.support import TouchlineData, populate_touchline_data
+
+import main
+
+SYMBOLS = ["TCS.NS", "INFY.NS", "RELIANCE.NS", "HDFCBANK.NS", "SBIN.NS"]
+
+
+def make_td():
+    """A TD object running the real SDK subscription code, minus the network"""
+    td = TD.__new__(TD)
+    td.live_websocket = SimpleNamespace(subscription_type="tick+bidask", send=lambda msg: None)
+    td.live_data = {}
+    td.one_min_live_data = {}
+    td.five_min_live_data = {}
+    td.touchline_data = {}
+    td.symbol_mkt_id_map = defaultdict(set)
+    td.default_market_data_id = 2000
+    return td
+
+
+@pytest.fixture
+def td_app(monkeypatch):
+    td = make_td()
+    monkeypatch.setattr(main, "td_app", td)
+    monkeypatch.setattr(main, "TICK_WAIT_TIMEOUT", 0.01)
+    monkeypatch.setattr(main, "_subscribed", {})
+    monkeypatch.setattr(main, "_pending", {})
+    monkeypatch.setattr(main, "_last_access", {})
+    # asyncio primitives bind to the first loop that waits on them; each test runs its own
+    monkeypatch.setattr(main, "_subscribe_lock", asyncio.Lock())
+    monkeypatch.setattr(main, "SDK_SEM", asyncio.Semaphore(16))
+    monkeypatch.setattr(main, "_pending_added", asyncio.Event())
+    return td
+
+
+def test_batch_subscribe_maps_each_symbol_to_its_own_req_id(td_app):
+    clean_syms = [main.get_clean_symbol(sym) for sym in SYMBOLS]
+    req_ids = asyncio.run(main.wait_for_ticks(clean_syms))
+
+    assert set(req_ids) == set(clean_syms)
+    for clean_sym, req_id in req_ids.items():
+        assert td_app.live_data[req_id].symbol == clean_sym
+
+
+def test_quotes_serves_each_symbol_its_own_tick(td_app):
+    # First call subscribes; no ticks have arrived yet
+    response = asyncio.run(main.get_quotes(",".join(SYMBOLS)))
+    quotes = orjson.loads(response.body)
+    assert {quote["status"] for quote in quotes.values()} == {"Waiting for tick..."}
+
+    # Give each contract a distinct price, as the socket would
+    prices = {}
+    for i, (contract, ids) in enumerate(td_app.symbol_mkt_id_map.items()):
+        for req_id in ids:
+            tick = td_app.live_data[req_id]
+            tick.timestamp, tick.ltp = "2024-10-15T09:15:00", 100.0 + i
+        prices[contract] = 100.0 + i
+
+    quotes = orjson.loads(asyncio.run(main.get_quotes(",".join(SYMBOLS))).body)
+    for sym in SYMBOLS:
+        assert quotes[sym]["price"] == prices[main.get_clean_symbol(sym)]
+
+
+
+def test_placeholder_tick_is_not_ready(td_app):
+    response = asyncio.run(main.get_quote("TCS.NS"))
+    assert orjson.loads(response.body)["status"] == "Waiting for tick..."
+
+
+def test_touchline_only_tick_is_served(td_app):
+    asyncio.run(main.get_quote("TCS.NS"))
+    req_id = main._subscribed["TCS"]
+
+    # The snapshot sent on subscribe: price fields set, but no trade timestamp
+    touchline = TouchlineData()
+    touchline.symbol, touchline.ltp, touchline.high, touchline.low, touchline.prev_close = "TCS", 3500.0, 3520.0, 3480.0, 3450.0
+    populate_touchline_data(td_app.live_data[req_id], touchline)
+    assert td_app.live_data[req_id].timestamp is None
+
+    quote = orjson.loads(asyncio.run(main.get_quote("TCS.NS")).body)
+    assert quote["price"] == 3500.0
+    assert quote["high"] == 3520.0
+    assert "status" not in quote
+    assert "TCS" not in main._pending
+
+
+def age_subscriptions():
+    for sym in main._last_access:
+        main._last_access[sym] -= main.SUBSCRIPTION_IDLE_TTL + 1
+
+
+def test_pruner_unsubscribes_by_uppercased_contract(td_app):
+    asyncio.run(main.wait_for_ticks(["tcs"]))
+    assert "TCS" in td_app.symbol_mkt_id_map
+
+    age_subscriptions()
+    asyncio.run(main.prune_idle_subscriptions())
+
+    assert "TCS" not in td_app.symbol_mkt_id_map
+    assert "tcs" not in td_app.symbol_mkt_id_map
+    assert main._subscribed == {}
+
+
+def test_request_during_unsubscribe_gets_a_fresh_subscription(td_app):
+    old_req_id = asyncio.run(main.wait_for_ticks(["TCS"]))["TCS"]
+    age_subscriptions()
+
+    stop_live_data = td_app.stop_live_data
+    def slow_stop(contracts):
+        time.sleep(0.05)
+        stop_live_data(contracts)
+    td_app.stop_live_data = slow_stop
+
+    async def request_mid_prune():
+        await asyncio.sleep(0.01)
+        return await main.wait_for_ticks(["TCS"])
+
+    async def scenario():
+        _, req_ids = await asyncio.gather(main.prune_idle_subscriptions(), request_mid_prune())
+        return req_ids
+
+    new_req_id = asyncio.run(scenario())["TCS"]
+    assert new_req_id != old_req_id
+    assert main._subscribed == {"TCS": new_req_id}
+    assert td_app.symbol_mkt_id_map["TCS"] == {new_req_id}
+
+@pytest.mark.parametrize("message", ['{"symbols": [5]}', '{"symbols": [["x"]]}', '{"symbols": "TCS.NS"}', "[1]", "nope"])
+def test_parse_watchlist_rejects_malformed_messages(message):
+    assert main.parse_watchlist(message) is None
+
+
+def test_parse_watchlist_accepts_symbol_list():
+    assert main.parse_watchlist('{"symbols": ["TCS.NS", "AAPL"]}') == ["TCS.NS", "AAPL"]
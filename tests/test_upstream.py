@@ -0,0 +1,263 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+def run_with_transport(handler, coro_factory):
+    """Runs coro_factory() with app.state.http backed by an httpx.MockTransport"""
+    async def runner():
+        main.app.state.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await coro_factory()
+        finally:
+            await main.app.state.http.aclose()
+    return asyncio.run(runner())
+
+
+@pytest.fixture
+def client():
+    """TestClient whose TrueData REST calls go to the handler set via client.upstream"""
+    handlers = []
+
+    async def dispatch(request):
+        return handlers[-1](request)
+
+    with TestClient(main.app) as test_client:
+        main.app.state.http = httpx.AsyncClient(transport=httpx.MockTransport(dispatch))
+        test_client.upstream = handlers.append
+        yield test_client
+
+
+@pytest.mark.parametrize("error", [httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout])
+def test_upstream_get_retries_connection_failures(error):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            raise error("down", request=request)
+        return httpx.Response(200, json={"Records": []})
+
+    response = run_with_transport(handler, lambda: main.upstream_get("https://td.test/h", {}))
+    assert response.status_code == 200
+    assert len(calls) == 2
+
+
+def test_upstream_get_does_not_retry_read_timeouts():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ReadTimeout("slow", request=request)
+
+    with pytest.raises(httpx.ReadTimeout):
+        run_with_transport(handler, lambda: main.upstream_get("https://td.test/h", {}))
+    assert len(calls) == 1
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches(monkeypatch):
+    for cache in (main.EOD_CACHE, main.INTRADAY_CACHE, main.FUNDAMENTAL_CACHE):
+        cache.clear()
+    monkeypatch.setattr(main, "_inflight_fetches", {})
+    # asyncio primitives bind to the first loop that waits on them; each test runs its own
+    monkeypatch.setattr(main, "HISTORY_SEM", asyncio.Semaphore(8))
+    monkeypatch.setattr(main, "FUNDAMENTAL_SEM", asyncio.Semaphore(4))
+
+
+def concurrent_fetches(handler, n=6, cache=None):
+    cache = main.EOD_CACHE if cache is None else cache
+
+    async def fetch_all():
+        return await asyncio.gather(
+            *[main.cached_fetch(cache, "k", main.HISTORY_SEM, "https://td.test/h", {}, main.is_history_payload)
+              for _ in range(n)],
+            return_exceptions=True
+        )
+    return run_with_transport(handler, fetch_all)
+
+
+def slow_handler(calls, response=None, error=None):
+    async def handler(request):
+        calls.append(request)
+        await asyncio.sleep(0.05)
+        if error:
+            raise error("down", request=request)
+        return response
+    return handler
+
+
+def test_concurrent_misses_share_one_upstream_call():
+    calls = []
+    results = concurrent_fetches(slow_handler(calls, httpx.Response(200, json={"Records": [[1]]})))
+
+    assert len(calls) == 1
+    assert results == [(200, {"Records": [[1]]})] * 6
+    assert main.EOD_CACHE["k"] == {"Records": [[1]]}
+    assert main._inflight_fetches == {}
+
+
+def test_concurrent_misses_share_one_failed_call():
+    calls = []
+    results = concurrent_fetches(slow_handler(calls, httpx.Response(500)))
+
+    assert len(calls) == 1
+    assert results == [(500, None)] * 6
+    assert "k" not in main.EOD_CACHE
+    assert main._inflight_fetches == {}
+
+
+def test_concurrent_misses_share_one_connection_failure():
+    calls = []
+    results = concurrent_fetches(slow_handler(calls, error=httpx.ConnectError))
+
+    assert len(calls) == 2  # The original attempt plus its one retry
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+    assert main._inflight_fetches == {}
+
+
+def test_failed_fetch_is_retried_on_the_next_miss():
+    calls = []
+    concurrent_fetches(slow_handler(calls, httpx.Response(500)), n=1)
+    concurrent_fetches(slow_handler(calls, httpx.Response(500)), n=1)
+    assert len(calls) == 2
+
+
+def test_error_shaped_200_is_not_cached():
+    calls = []
+    results = concurrent_fetches(slow_handler(calls, httpx.Response(200, json={"status": "No data"})), n=1)
+
+    assert results == [(200, None)]
+    assert "k" not in main.EOD_CACHE
+
+
+def test_error_shaped_200_falls_back_with_no_store(client):
+    client.upstream(lambda request: httpx.Response(200, json={"status": "No data"}))
+    response = client.get("/history", params={"symbol": "TCS.NS"})
+
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+    assert len(response.json()) == 30  # Mock candles
+
+
+def history_handler(request):
+    return httpx.Response(200, json={"Records": [["2024-10-15T00:00:00", 1, 2, 0.5, 1.5, 100]]})
+
+
+def test_live_history_is_publicly_cacheable_with_etag(client):
+    client.upstream(history_handler)
+    response = client.get("/history", params={"symbol": "TCS.NS"})
+
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    assert response.headers["etag"].startswith('"')
+    assert response.json()[0]["close"] == 1.5
+
+
+def test_intraday_history_gets_short_max_age(client):
+    client.upstream(history_handler)
+    response = client.get("/history", params={"symbol": "TCS.NS", "period": "1d"})
+    assert response.headers["cache-control"] == "public, max-age=60"
+
+
+@pytest.mark.parametrize("if_none_match", ["{etag}", "W/{etag}", '"other", {etag}', "*"])
+def test_matching_if_none_match_returns_304(client, if_none_match):
+    client.upstream(history_handler)
+    etag = client.get("/history", params={"symbol": "TCS.NS"}).headers["etag"]
+
+    response = client.get(
+        "/history", params={"symbol": "TCS.NS"}, headers={"If-None-Match": if_none_match.format(etag=etag)}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_stale_if_none_match_returns_body(client):
+    client.upstream(history_handler)
+    response = client.get("/history", params={"symbol": "TCS.NS"}, headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.json()
+
+
+def test_upstream_failure_history_is_no_store(client):
+    client.upstream(lambda request: httpx.Response(503))
+    response = client.get("/history", params={"symbol": "TCS.NS"})
+
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+
+
+def test_mock_us_history_is_no_store(client):
+    response = client.get("/history", params={"symbol": "AAPL"})
+    assert response.headers["cache-control"] == "no-store"
+    assert "etag" not in response.headers
+
+
+def test_empty_fundamentals_are_no_store(client):
+    client.upstream(lambda request: httpx.Response(500))
+    response = client.get("/fundamentals", params={"symbol": "TCS.NS"})
+
+    assert response.headers["cache-control"] == "no-store"
+    assert response.json()["forecast"]["recommendation"] == "WAITING"
+
+
+def test_live_fundamentals_are_cacheable(client):
+    client.upstream(lambda request: httpx.Response(200, json={"pe": 31.2, "recommendation": "BUY"}))
+    response = client.get("/fundamentals", params={"symbol": "TCS.NS"})
+
+    assert response.headers["cache-control"] == "public, max-age=3600"
+    assert response.json()["pe_ratio"] == 31.2
+
+
+def test_dashboard_unwraps_history_and_fundamentals(client):
+    client.upstream(lambda request: (
+        history_handler(request) if "history" in str(request.url) else httpx.Response(200, json={"pe": 20})
+    ))
+    body = client.get("/dashboard", params={"symbol": "TCS.NS"}).json()
+
+    assert body["history"][0]["close"] == 1.5
+    assert body["fundamentals"]["pe_ratio"] == 20
+    assert body["quote"]["status"] == "Disconnected"
+
+
+def test_columnar_history_returns_one_list_per_field(client):
+    client.upstream(lambda request: httpx.Response(200, json={"Records": [
+        ["2024-10-14T00:00:00", 1, 2, 0.5, 1.5, 100],
+        ["2024-10-15T00:00:00", 1.5, 2.5, 1, 2],  # No volume column
+        ["short", 1],  # Dropped: fewer than 5 fields
+    ]}))
+    body = client.get("/history", params={"symbol": "TCS.NS", "format": "columnar"}).json()
+
+    assert body == {
+        "date": ["2024-10-14T00:00:00", "2024-10-15T00:00:00"],
+        "open": [1, 1.5],
+        "high": [2, 2.5],
+        "low": [0.5, 1],
+        "close": [1.5, 2],
+        "volume": [100, 0],
+    }
+
+
+def test_columnar_matches_row_format(client):
+    client.upstream(history_handler)
+    rows = client.get("/history", params={"symbol": "TCS.NS"}).json()
+    columns = client.get("/history", params={"symbol": "TCS.NS", "format": "columnar"}).json()
+
+    assert list(columns) == list(main.HISTORY_COLUMNS)
+    assert [dict(zip(columns, values)) for values in zip(*columns.values())] == rows
+
+
+def test_columnar_etag_differs_from_row_etag(client):
+    client.upstream(history_handler)
+    rows = client.get("/history", params={"symbol": "TCS.NS"})
+    columns = client.get("/history", params={"symbol": "TCS.NS", "format": "columnar"})
+    assert rows.headers["etag"] != columns.headers["etag"]
+
+
+def test_columnar_mock_history_for_us_symbols(client):
+    body = client.get("/history", params={"symbol": "AAPL", "format": "columnar"}).json()
+    assert {len(values) for values in body.values()} == {30}